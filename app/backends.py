@@ -0,0 +1,188 @@
+# app/backends.py
+"""
+Alternative runtimes for the Iris classifier. Each exposes the same predict()
+interface as the sklearn estimator: a float32 (N, 4) array in, an array of
+class indices out. app.main picks the first one whose model file is present.
+"""
+import hashlib
+import importlib.machinery
+import importlib.util
+import os
+import stat
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+# ONNX Runtime, Numba and cffi are optional: without them their backends are skipped
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    import cffi
+except ImportError:
+    cffi = None
+
+class LinearModel:
+    """Linear classifier evaluated with numpy from a memory-mapped weights file."""
+    def __init__(self, path: Path):
+        # (n_classes, n_features + 1) array of [coef_ | intercept_], written by scripts/export_linear.py.
+        # Memory-mapped read-only, so workers share the file's page cache instead of copying it
+        self.weights = np.load(path, mmap_mode="r")
+        self.coef_t = self.weights[:, :-1].T # (n_features, n_classes) view, no copy
+        self.intercept = self.weights[:, -1]
+
+    def predict(self, input_data: np.ndarray) -> np.ndarray:
+        """Return argmax(X @ coef_.T + intercept_) for each row, as LogisticRegression.predict does."""
+        return np.argmax(input_data @ self.coef_t + self.intercept, axis=1)
+
+def _linear_argmax_py(weights, input_data, out):
+    """Write argmax_k(weights[k, :-1] . x + weights[k, -1]) for each row x into out."""
+    n_classes, n_cols = weights.shape
+    n_features = n_cols - 1
+    for i in range(input_data.shape[0]):
+        best_class = 0
+        best_score = -np.inf
+        for k in range(n_classes):
+            score = weights[k, n_features]
+            for j in range(n_features):
+                score += weights[k, j] * input_data[i, j]
+            if score > best_score: # Strict, so ties keep the first class like np.argmax
+                best_score = score
+                best_class = k
+        out[i] = best_class
+
+if njit is not None:
+    try:
+        # Keep compiled code on disk so worker startups after the first skip the JIT
+        _linear_argmax = njit(cache=True)(_linear_argmax_py)
+    except RuntimeError:
+        # numba resolves the cache location here, at import time, and raises when no cache
+        # directory is writable (read-only filesystem, no HOME); compile on warm-up instead
+        _linear_argmax = njit(_linear_argmax_py)
+
+class NumbaLinearModel(LinearModel):
+    """LinearModel evaluated by a Numba-compiled loop instead of numpy matmul + argmax."""
+    def predict(self, input_data: np.ndarray) -> np.ndarray:
+        """Return the predicted class index for each row of a float32 (N, 4) array."""
+        out = np.empty(input_data.shape[0], dtype=np.int64)
+        _linear_argmax(self.weights, input_data, out)
+        return out
+
+# Compiled native predictors are cached here, keyed by a hash of their C source. The default is a
+# per-user cache directory, never a shared temp dir: whatever .so sits here is loaded into the process
+NATIVE_CACHE_DIR = Path(os.environ.get(
+    "NATIVE_CACHE_DIR",
+    Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "deploy-ml-model" / "native"
+))
+
+def _check_private(path: Path, is_dir: bool):
+    """Refuse a cache entry another user could have planted or could still modify."""
+    st = path.lstat() # Don't follow symlinks
+    right_kind = stat.S_ISDIR(st.st_mode) if is_dir else stat.S_ISREG(st.st_mode)
+    # The directory must be private (0700); the module must not be group/world-writable
+    foreign_bits = st.st_mode & (0o077 if is_dir else 0o022)
+    if not right_kind or st.st_uid != os.geteuid() or foreign_bits:
+        raise PermissionError(
+            f"Refusing to use {path}: it must be a {'directory' if is_dir else 'regular file'} owned by "
+            f"this user and not accessible to others"
+        )
+
+_NATIVE_CDEF = """
+int predict_one(double x0, double x1, double x2, double x3);
+void predict_batch(const float *x, long n, int64_t *out);
+"""
+
+def _linear_c_source(weights: np.ndarray) -> str:
+    """Emit C for argmax(X @ coef_.T + intercept_) with every coefficient baked in as a literal."""
+    n_classes, n_cols = weights.shape
+    n_features = n_cols - 1
+    if n_features != 4:
+        # predict_one/predict_batch hardcode the 4 Iris features and a row stride of 4
+        raise ValueError(f"the native predictor is specialized for 4 features, got {n_features}")
+    # float.hex() literals are exact, so the C code sees the same doubles as numpy
+    lines = ["#include <stdint.h>", "", "int predict_one(double x0, double x1, double x2, double x3) {"]
+    # Round to float32 first, like every batched path, so /predict and /batch_predict always agree
+    lines += [f"    x{j} = (float)x{j};" for j in range(n_features)]
+    for k in range(n_classes):
+        terms = " + ".join(f"{float(weights[k, j]).hex()} * x{j}" for j in range(n_features))
+        lines.append(f"    double s{k} = {terms} + {float(weights[k, n_features]).hex()};")
+    lines.append("    int best = 0;")
+    lines.append("    double best_score = s0;")
+    for k in range(1, n_classes):
+        # Strict, so ties keep the first class like np.argmax
+        lines.append(f"    if (s{k} > best_score) {{ best = {k}; best_score = s{k}; }}")
+    lines += [
+        "    return best;",
+        "}",
+        "",
+        "void predict_batch(const float *x, long n, int64_t *out) {",
+        "    for (long i = 0; i < n; i++) {",
+        "        const float *row = x + 4 * i;",
+        "        out[i] = predict_one(row[0], row[1], row[2], row[3]);",
+        "    }",
+        "}",
+    ]
+    return "\n".join(lines) + "\n"
+
+def _load_native_module(source: str):
+    """Compile the C source with cffi (or reuse a cached build) and import the extension."""
+    digest = hashlib.sha256((_NATIVE_CDEF + source).encode()).hexdigest()[:16]
+    module_name = f"_iris_native_{digest}"
+    cache_dir = NATIVE_CACHE_DIR
+    cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+    _check_private(cache_dir, is_dir=True)
+    module_path = cache_dir / (module_name + importlib.machinery.EXTENSION_SUFFIXES[0])
+    if not os.path.lexists(module_path):
+        ffi = cffi.FFI()
+        ffi.cdef(_NATIVE_CDEF)
+        ffi.set_source(module_name, source)
+        # Build in a private directory and move into place atomically, so gunicorn workers
+        # compiling at the same time never load a half-written file
+        with tempfile.TemporaryDirectory(dir=cache_dir) as build_dir:
+            os.replace(ffi.compile(tmpdir=build_dir), module_path)
+    _check_private(module_path, is_dir=False)
+    spec = importlib.util.spec_from_file_location(module_name, module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class NativeLinearModel:
+    """Linear classifier compiled at load time to C with its coefficients and the 4-feature shape hardcoded."""
+    def __init__(self, path: Path):
+        module = _load_native_module(_linear_c_source(np.load(path)))
+        self._ffi = module.ffi
+        self._lib = module.lib
+        # Single-row entry point: four floats in (rounded to float32), class index out, no numpy involved
+        self.predict_one = module.lib.predict_one
+
+    def predict(self, input_data: np.ndarray) -> np.ndarray:
+        """Return the predicted class index for each row of a float32 (N, 4) array."""
+        input_data = np.ascontiguousarray(input_data, dtype=np.float32)
+        out = np.empty(input_data.shape[0], dtype=np.int64)
+        self._lib.predict_batch(
+            self._ffi.from_buffer("float[]", input_data), input_data.shape[0],
+            self._ffi.from_buffer("int64_t[]", out)
+        )
+        return out
+
+class OnnxModel:
+    """ONNX Runtime session exposing the same predict() interface as the sklearn estimator."""
+    def __init__(self, path: Path):
+        sess_options = ort.SessionOptions()
+        sess_options.intra_op_num_threads = 1 # Batches are tiny; threading costs more than it saves
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(str(path), sess_options=sess_options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.label_name = self.session.get_outputs()[0].name
+
+    def predict(self, input_data: np.ndarray) -> np.ndarray:
+        """Return the predicted class index for each row of a float32 (N, 4) array."""
+        return self.session.run([self.label_name], {self.input_name: input_data})[0]
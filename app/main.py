@@ -1,70 +1,270 @@
 # app/main.py
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
+import fastapi
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel, Field, conlist
+from typing import Annotated, List
+import anyio
 import joblib
 import numpy as np
 import os
+import asyncio
+import logging
+import logging.handlers
+import queue
+from collections import OrderedDict
 from contextlib import asynccontextmanager
 from pathlib import Path # Import pathlib
 
-# --- Global variable for the model ---
+from app import backends
+
+# --- Logging ---
+# Records are handed to a queue on the request path and written to stderr by a
+# QueueListener thread (started in lifespan), so log I/O never blocks a request
+logger = logging.getLogger(__name__)
+logger.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+logger.propagate = False
+_log_queue = queue.SimpleQueue()
+logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_handler)
+
+# --- Global variables for the model ---
 ml_model = None
+model_backend = None # "native", "numba", "linear", "onnx" or "sklearn", whichever was loaded
+model_source_path = None # File the loaded model was read from
+_predict_one = None # Single-row predictor (four floats -> class index), if the backend has one
 
 # --- Model Loading Logic ---
 # Construct the absolute path to the model file using pathlib for robustness
 APP_DIR = Path(__file__).resolve().parent # Directory of main.py (e.g., /path/to/project/app)
 ROOT_DIR = APP_DIR.parent # Project root directory (e.g., /path/to/project)
 MODEL_PATH = ROOT_DIR / "model" / "simple_model.joblib" # Path to model file
+# Memory-mapped [coef_ | intercept_] weights built from MODEL_PATH by scripts/export_linear.py
+LINEAR_MODEL_PATH = ROOT_DIR / "model" / "simple_model.weights.npy"
+# int8 model built from MODEL_PATH by scripts/quantize_onnx.py
+ONNX_MODEL_PATH = ROOT_DIR / "model" / "simple_model.int8.onnx"
+
+# Faster runtimes tried in order before falling back to the joblib model: (name, path, loader).
+# The linear-weights backends come first: they are exact and need no extra runtime (numpy is
+# always there). ONNX stays as the general runtime for a model that has no linear export
+# (scripts/export_linear.py only handles linear classifiers); install onnxruntime to enable it.
+_FAST_BACKENDS = []
+if backends.cffi is not None:
+    _FAST_BACKENDS.append(("native", LINEAR_MODEL_PATH, backends.NativeLinearModel))
+if backends.njit is not None:
+    _FAST_BACKENDS.append(("numba", LINEAR_MODEL_PATH, backends.NumbaLinearModel))
+_FAST_BACKENDS.append(("linear", LINEAR_MODEL_PATH, backends.LinearModel))
+if backends.ort is not None:
+    _FAST_BACKENDS.append(("onnx", ONNX_MODEL_PATH, backends.OnnxModel))
+
+# Largest number of items accepted by one /batch_predict call
+MAX_BATCH_ITEMS = 4096
+
+# Largest accepted measurement; real Iris flowers are under 10 cm in every dimension
+MAX_FEATURE_CM = 100.0
+
+# Iris class names indexed by the model's predicted class index
+_IRIS_CLASSES = ("setosa", "versicolor", "virginica")
+_N_IRIS_CLASSES = len(_IRIS_CLASSES)
+
+# --- Micro-batching for /predict ---
+# Concurrent /predict calls are queued and coalesced into one model call
+MAX_BATCH = 64 # Maximum number of requests stacked into a single model call
+MAX_WAIT_MS = 5 # How long the first queued request waits for others to join its batch
+_batch_queue = None # asyncio.Queue of (features, future) pairs, created in lifespan
+_batch_worker = None # Background task draining _batch_queue
+
+# --- Prediction cache for /predict ---
+# LRU map of (sepal_length, sepal_width, petal_length, petal_width) -> class index.
+# Only touched from the event loop, so no locking is needed. Cleared whenever
+# the model is (re)loaded or released in lifespan.
+PREDICTION_CACHE_SIZE = 4096
+_prediction_cache = OrderedDict()
+
+def _cache_prediction(features: tuple, prediction_index: int):
+    """Store a prediction, evicting the least recently used entry when full."""
+    _prediction_cache[features] = prediction_index
+    if len(_prediction_cache) > PREDICTION_CACHE_SIZE:
+        _prediction_cache.popitem(last=False)
+
+def _predict_rows(input_data: np.ndarray) -> list:
+    """Predict each row on its own, returning its class index or the exception it raised."""
+    results = []
+    for row in range(input_data.shape[0]):
+        try:
+            results.append(ml_model.predict(input_data[row:row + 1])[0])
+        except Exception as e:
+            results.append(e)
+    return results
+
+async def _run_batch_worker(queue: asyncio.Queue):
+    """Drain the queue in batches and resolve each request's future with its prediction."""
+    loop = asyncio.get_running_loop()
+    # Preallocated input buffer reused for every batch; rows are filled in place
+    buf = np.empty((MAX_BATCH, 4), dtype=np.float32) # ONNX Runtime expects float32 input
+    batch = []
+    try:
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + MAX_WAIT_MS / 1000
+            while len(batch) < MAX_BATCH:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            futures = [future for _, future in batch]
+            for row, (features, _) in enumerate(batch):
+                buf[row] = features
+            input_data = buf[:len(batch)]
+            try:
+                # Run the blocking model call in a worker thread so the event loop keeps
+                # accepting requests; buf is not refilled until this call returns
+                results = await anyio.to_thread.run_sync(ml_model.predict, input_data)
+            except Exception:
+                # Retry row by row so only the request that broke the batch gets an error
+                results = await anyio.to_thread.run_sync(_predict_rows, input_data)
+
+            for future, result in zip(futures, results):
+                if future.done(): # The caller may have gone away
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+            batch = []
+    except asyncio.CancelledError:
+        # Shutting down: fail the requests already taken off the queue
+        for _, future in batch:
+            if not future.done():
+                future.cancel()
+        raise
 
 # --- Lifespan Context Manager for Startup/Shutdown ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Code to run on startup
-    global ml_model
-    print(f"Lifespan: Attempting to load model from: {MODEL_PATH}") # Log the exact path being checked
-    try:
-        if not MODEL_PATH.is_file(): # Use pathlib's check
-             # Provide more context in the error message
-             raise FileNotFoundError(f"Model file not found at calculated path: {MODEL_PATH}. Ensure 'simple_model.joblib' exists in the '{ROOT_DIR / 'model'}' directory.")
-        ml_model = joblib.load(MODEL_PATH)
-        print(f"Lifespan: Model loaded successfully from {MODEL_PATH}")
-    except FileNotFoundError as fnf_error:
-        print(f"Lifespan Fatal Error: {fnf_error}")
-        ml_model = None # Ensure model is None if loading fails
-    except Exception as e:
-        print(f"Lifespan Fatal Error loading model: {e}")
-        ml_model = None # Ensure model is None if loading fails
+    global ml_model, model_backend, model_source_path, _predict_one
+    _log_listener.start()
+    _prediction_cache.clear() # Cached results belong to the previously loaded model
+    for backend_name, backend_path, backend_loader in _FAST_BACKENDS:
+        if not backend_path.is_file():
+            continue
+        logger.info("Lifespan: Attempting to load %s model from: %s", backend_name, backend_path)
+        try:
+            ml_model = backend_loader(backend_path)
+            # Warm up with a dummy row so JIT compilation and first-run setup don't hit a request
+            ml_model.predict(np.zeros((1, 4), dtype=np.float32))
+            model_backend = backend_name
+            model_source_path = backend_path
+            logger.info("Lifespan: %s model loaded successfully from %s", backend_name, backend_path)
+            break
+        except Exception as e:
+            logger.error("Lifespan Error loading %s model, trying next backend: %s", backend_name, e)
+            ml_model = None
+    if ml_model is None:
+        logger.info("Lifespan: Attempting to load model from: %s", MODEL_PATH) # Log the exact path being checked
+        try:
+            if not MODEL_PATH.is_file(): # Use pathlib's check
+                 # Provide more context in the error message
+                 raise FileNotFoundError(f"Model file not found at calculated path: {MODEL_PATH}. Ensure 'simple_model.joblib' exists in the '{ROOT_DIR / 'model'}' directory.")
+            # Memory-map the estimator's numpy arrays read-only so workers share them through the
+            # page cache; this needs an uncompressed dump (joblib.dump(model, path, compress=0))
+            ml_model = joblib.load(MODEL_PATH, mmap_mode="r")
+            model_backend = "sklearn"
+            model_source_path = MODEL_PATH
+            logger.info("Lifespan: Model loaded successfully from %s", MODEL_PATH)
+        except FileNotFoundError as fnf_error:
+            logger.error("Lifespan Fatal Error: %s", fnf_error)
+            ml_model = None # Ensure model is None if loading fails
+        except Exception as e:
+            logger.error("Lifespan Fatal Error loading model: %s", e)
+            ml_model = None # Ensure model is None if loading fails
+    _predict_one = getattr(ml_model, "predict_one", None)
+    # Start the micro-batching worker on this event loop
+    global _batch_queue, _batch_worker
+    _batch_queue = asyncio.Queue()
+    _batch_worker = asyncio.create_task(_run_batch_worker(_batch_queue))
     yield
     # Code to run on shutdown (e.g., cleanup resources)
-    print("Lifespan: Cleaning up resources...")
+    logger.info("Lifespan: Cleaning up resources...")
+    _batch_worker.cancel()
+    try:
+        await _batch_worker
+    except asyncio.CancelledError:
+        pass
+    while not _batch_queue.empty(): # Fail any requests still waiting for a batch
+        _, future = _batch_queue.get_nowait()
+        future.cancel()
+    _batch_queue = None
+    _batch_worker = None
     ml_model = None # Clear the model from memory
+    model_backend = None
+    model_source_path = None
+    _predict_one = None
+    _prediction_cache.clear()
+    _log_listener.stop() # Flushes any queued records
+
+# FastAPI >= 0.130 serializes response_model results straight to JSON bytes with Pydantic,
+# which beats orjson and is disabled by any custom response class. Older releases (the newest
+# installable on Python 3.9) go through the stdlib json encoder, so use orjson there instead.
+_FASTAPI_VERSION = tuple(int(part) for part in fastapi.__version__.split(".")[:2])
+_response_options = {} if _FASTAPI_VERSION >= (0, 130) else {"default_response_class": ORJSONResponse}
 
 # Define the application with the lifespan manager
 app = FastAPI(
     title="Deploy ML Model API",
     description="API for a simple pre-trained Scikit-learn Iris model.",
     version="0.1.0",
-    lifespan=lifespan # Register the lifespan context manager
+    lifespan=lifespan, # Register the lifespan context manager
+    **_response_options
 )
 
 # --- Pydantic Models for Input/Output ---
 # Use Field for examples and descriptions (requires Pydantic v2+)
 class ModelInput(BaseModel):
     """Input features for prediction."""
-    sepal_length: float = Field(..., example=5.1, description="Sepal length in cm")
-    sepal_width: float = Field(..., example=3.5, description="Sepal width in cm")
-    petal_length: float = Field(..., example=1.4, description="Petal length in cm")
-    petal_width: float = Field(..., example=0.2, description="Petal width in cm")
+    # One fixed-length list validates in a single pass and maps straight onto a model input row.
+    # Each value must be a real measurement: NaN/Infinity, and finite values that overflow float32
+    # (e.g. 1e39 becomes inf in the float32 model input), would otherwise be silently classified
+    # differently by each backend
+    features: conlist(
+        Annotated[float, Field(allow_inf_nan=False, ge=0.0, le=MAX_FEATURE_CM)], min_length=4, max_length=4
+    ) = Field(
+        ..., example=[5.1, 3.5, 1.4, 0.2],
+        description="[sepal_length, sepal_width, petal_length, petal_width] in cm"
+    )
 
 class PredictionOutput(BaseModel):
     """Prediction result."""
     prediction: int = Field(..., example=0, description="Predicted class index (0, 1, or 2 for Iris)")
     class_name: str = Field(..., example="setosa", description="Predicted class name")
 
+class BatchInput(BaseModel):
+    """A batch of input features, predicted in a single model call."""
+    # Bounded so one request can't monopolize a worker thread with an arbitrarily large array
+    items: List[ModelInput] = Field(..., min_length=1, max_length=MAX_BATCH_ITEMS, description="Flowers to classify")
+
 class ErrorOutput(BaseModel):
     """Error message structure."""
     detail: str
 
+@app.exception_handler(RequestValidationError)
+async def validation_error_handler(request: Request, exc: RequestValidationError):
+    """FastAPI's default 422 response, with rejected NaN/Infinity inputs echoed as strings (JSON can't encode them)."""
+    errors = [
+        dict(error, input=str(error["input"])) if error["type"] == "finite_number" else error
+        for error in exc.errors()
+    ]
+    return JSONResponse(status_code=422, content={"detail": jsonable_encoder(errors)})
+
 # --- API Endpoints ---
 @app.get("/")
 def read_root():
@@ -78,52 +278,94 @@ def read_root():
               400: {"model": ErrorOutput, "description": "Model not loaded"},
               500: {"model": ErrorOutput, "description": "Prediction error"}
           })
-def predict(data: ModelInput):
+async def predict(data: ModelInput):
     """
     Makes a prediction based on input features.
-    Requires sepal_length, sepal_width, petal_length, petal_width.
+    Requires features as [sepal_length, sepal_width, petal_length, petal_width].
     Returns the predicted class index and name.
+    Concurrent calls are coalesced into a single model call by the batch worker,
+    unless the backend has a compiled single-row predictor.
     """
     # Access the globally loaded model
     if ml_model is None:
         # Log the path that was checked during startup for debugging
-        print(f"Prediction failed: Model not loaded. Checked path during startup: {MODEL_PATH}")
+        logger.warning("Prediction failed: Model not loaded. Checked path during startup: %s", MODEL_PATH)
         raise HTTPException(status_code=400, detail=f"Model is not loaded or failed to load. Check server logs. Path checked at startup: {MODEL_PATH}")
 
     try:
-        # Convert input data to numpy array format expected by the model
-        input_data = np.array([[
-            data.sepal_length,
-            data.sepal_width,
-            data.petal_length,
-            data.petal_width
-        ]])
-
-        # Make prediction
-        prediction_index = ml_model.predict(input_data)[0]
-        prediction_proba = ml_model.predict_proba(input_data)[0]
-
-        # Map index to Iris class name
-        iris_class_names = ['setosa', 'versicolor', 'virginica']
-        if 0 <= prediction_index < len(iris_class_names):
-            class_name = iris_class_names[prediction_index]
+        # Hashable cache key; the batch worker copies it straight into its preallocated input buffer
+        features = tuple(data.features)
+
+        if _predict_one is not None:
+            # Compiled straight-line C: cheaper than a cache lookup, a queue round trip or a thread hop
+            prediction_index = _predict_one(*features)
+        elif (prediction_index := _prediction_cache.get(features)) is not None:
+            _prediction_cache.move_to_end(features)
         else:
-            class_name = "unknown"
+            # Queue the features for the batch worker and wait for this row's result
+            future = asyncio.get_running_loop().create_future()
+            await _batch_queue.put((features, future))
+            prediction_index = int(await future)
+            _cache_prediction(features, prediction_index)
+
+        # Map index to Iris class name; indices are never negative
+        class_name = _IRIS_CLASSES[prediction_index] if prediction_index < _N_IRIS_CLASSES else "unknown"
 
-        print(f"Input: {input_data.tolist()}, Prediction Index: {prediction_index}, Class: {class_name}, Probabilities: {prediction_proba.tolist()}")
+        # Lazy %-formatting: nothing is formatted unless DEBUG is enabled
+        logger.debug("Input: %s, Prediction Index: %s, Class: %s", features, prediction_index, class_name)
 
-        return PredictionOutput(prediction=int(prediction_index), class_name=class_name)
+        # Both fields are computed locally from known-valid values, so skip re-validation
+        return PredictionOutput.model_construct(prediction=int(prediction_index), class_name=class_name)
 
     except Exception as e:
-        print(f"Prediction failed for input {data.dict()}: {e}")
+        logger.exception("predict failed")
+        logger.debug("payload=%r", data) # Lazy: only formatted when DEBUG is enabled
         raise HTTPException(status_code=500, detail=f"Prediction failed: {str(e)}")
 
+@app.post("/batch_predict/",
+          response_model=List[PredictionOutput],
+          responses={
+              400: {"model": ErrorOutput, "description": "Model not loaded"},
+              500: {"model": ErrorOutput, "description": "Prediction error"}
+          })
+async def batch_predict(data: BatchInput):
+    """
+    Makes predictions for a list of inputs in one model call.
+    Each item requires features as [sepal_length, sepal_width, petal_length, petal_width].
+    Returns the predicted class index and name for each item, in order.
+    """
+    if ml_model is None:
+        logger.warning("Batch prediction failed: Model not loaded. Checked path during startup: %s", MODEL_PATH)
+        raise HTTPException(status_code=400, detail=f"Model is not loaded or failed to load. Check server logs. Path checked at startup: {MODEL_PATH}")
+
+    try:
+        # Stack all inputs into one (N, 4) array so the model is invoked once per batch
+        input_data = np.asarray([i.features for i in data.items], dtype=np.float32)
+
+        # One tolist() call gives plain ints, which index the tuple fastest and log cheaply
+        prediction_indices = (await anyio.to_thread.run_sync(ml_model.predict, input_data)).tolist()
+
+        results = []
+        for prediction_index in prediction_indices:
+            class_name = _IRIS_CLASSES[prediction_index] if prediction_index < _N_IRIS_CLASSES else "unknown"
+            results.append(PredictionOutput.model_construct(prediction=prediction_index, class_name=class_name))
+
+        logger.debug("Batch size: %d, Prediction Indices: %s", len(results), prediction_indices)
+
+        return results
+
+    except Exception as e:
+        logger.exception("batch_predict failed for %d inputs", len(data.items))
+        logger.debug("payload=%r", data)
+        raise HTTPException(status_code=500, detail=f"Batch prediction failed: {str(e)}")
+
 @app.get("/model_status")
 def model_status():
    """Check if the model is loaded."""
    # Check the global variable
    model_loaded_status = ml_model is not None
-   print(f"Model status check: {'Loaded' if model_loaded_status else 'Not Loaded'}. Path checked at startup: {MODEL_PATH}")
+   loaded_path = model_source_path or MODEL_PATH
+   logger.debug("Model status check: %s. Path checked at startup: %s", 'Loaded' if model_loaded_status else 'Not Loaded', loaded_path)
    # Return the absolute path string for clarity in the response
    # **HIGHLIGHT: Ensure this key matches the test expectation**
-   return {"model_loaded": model_loaded_status, "model_path_checked_at_startup": str(MODEL_PATH)}
+   return {"model_loaded": model_loaded_status, "model_backend": model_backend, "model_path_checked_at_startup": str(loaded_path)}
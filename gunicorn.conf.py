@@ -0,0 +1,30 @@
+# gunicorn.conf.py
+# Production server config: gunicorn manages N uvicorn worker processes, each with
+# its own event loop, batch worker and model (loaded in the app's lifespan), so the
+# CPU-bound model scales across cores.
+#
+# Usage (from the project root):
+#     gunicorn -c gunicorn.conf.py app.main:app
+import os
+
+def _usable_cpus():
+    """CPUs this process may run on (respects taskset/cpuset affinity), else the host's count."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+
+# One worker per usable core by default; each worker holds its own model. Affinity does not
+# reflect a container CPU quota (docker --cpus / Kubernetes limits), so set WEB_CONCURRENCY
+# to the quota there, or too many workers contend for the allowed CPU time.
+workers = int(os.environ.get("WEB_CONCURRENCY", _usable_cpus()))
+worker_class = "uvicorn_worker.UvicornWorker"
+
+# Import the app once in the master before forking so module-level state is shared
+# copy-on-write. The model itself is loaded per worker in lifespan; for larger models
+# the memory-mapped weights backend shares its pages through the OS page cache.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "false").lower() in ("1", "true", "yes")
+
+# Give in-flight batches time to finish on restart/shutdown
+graceful_timeout = 30
@@ -0,0 +1,34 @@
+# scripts/export_linear.py
+"""
+One-shot build step: dump the LogisticRegression parameters from
+model/simple_model.joblib into model/simple_model.weights.npy, a plain
+(n_classes, n_features + 1) float64 array of [coef_ | intercept_] that the API
+memory-maps at startup. Re-run whenever the joblib model changes.
+
+A single .npy is used rather than an .npz archive because np.load can only
+memory-map .npy files.
+
+Usage (from the project root):
+    python scripts/export_linear.py
+"""
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+MODEL_PATH = ROOT_DIR / "model" / "simple_model.joblib"
+WEIGHTS_PATH = ROOT_DIR / "model" / "simple_model.weights.npy"
+
+def main():
+    model = joblib.load(MODEL_PATH)
+    # The API returns the argmax column as the class index, which needs classes_ == [0, 1, ...]
+    # and one row of coefficients per class (multiclass, not a binary problem)
+    assert np.array_equal(model.classes_, np.arange(len(model.classes_))), "classes_ must be 0..n-1"
+    assert model.coef_.shape[0] == len(model.classes_), "expected one coefficient row per class"
+    weights = np.hstack([model.coef_, model.intercept_[:, None]]).astype(np.float64)
+    np.save(WEIGHTS_PATH, np.ascontiguousarray(weights))
+    print(f"Wrote {WEIGHTS_PATH} {weights.shape} from {MODEL_PATH}")
+
+if __name__ == "__main__":
+    main()
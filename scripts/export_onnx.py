@@ -0,0 +1,33 @@
+# scripts/export_onnx.py
+"""
+Convert model/simple_model.joblib to scripts/simple_model.onnx, the unquantized
+float32 ONNX export, for inspecting or benchmarking against the int8 model the API
+serves (built by scripts/quantize_onnx.py). The output is a local build artifact:
+it is gitignored, so generate it on demand.
+
+Usage (from the project root, with requirements-build.txt installed):
+    python scripts/export_onnx.py
+"""
+from pathlib import Path
+
+import joblib
+from skl2onnx import convert_sklearn
+from skl2onnx.common.data_types import FloatTensorType
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+MODEL_PATH = ROOT_DIR / "model" / "simple_model.joblib"
+ONNX_MODEL_PATH = Path(__file__).resolve().parent / "simple_model.onnx"
+
+def main():
+    model = joblib.load(MODEL_PATH)
+    onnx_model = convert_sklearn(
+        model,
+        initial_types=[("X", FloatTensorType([None, 4]))],
+        # Emit probabilities as a plain tensor instead of a list of dicts; the API only uses the label
+        options={id(model): {"zipmap": False}},
+    )
+    ONNX_MODEL_PATH.write_bytes(onnx_model.SerializeToString())
+    print(f"Wrote {ONNX_MODEL_PATH} from {MODEL_PATH}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# scripts/quantize_onnx.py
+"""
+One-shot build step: write model/simple_model.int8.onnx, an int8 dynamically
+quantized version of the Iris classifier, for the API to serve with ONNX Runtime.
+
+skl2onnx exports LogisticRegression as a single ai.onnx.ml LinearClassifier node,
+which ONNX Runtime's quantizer cannot touch. This script therefore rebuilds the
+decision function (argmax of X @ coef_.T + intercept_) from standard MatMul/Add/
+ArgMax ops, then runs quantize_dynamic so the MatMul becomes an int8 MatMulInteger.
+Re-run whenever the joblib model changes.
+
+Usage (from the project root, with requirements-build.txt installed):
+    python scripts/quantize_onnx.py
+"""
+import tempfile
+from pathlib import Path
+
+import joblib
+import numpy as np
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+from onnxruntime import InferenceSession
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from sklearn.datasets import load_iris
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+MODEL_PATH = ROOT_DIR / "model" / "simple_model.joblib"
+INT8_MODEL_PATH = ROOT_DIR / "model" / "simple_model.int8.onnx"
+
+def build_linear_graph(model) -> onnx.ModelProto:
+    """Express a fitted linear classifier as label = ArgMax(X @ W + b) with standard ONNX ops."""
+    # ArgMax returns a column index, which is only the class label when classes_ == [0, 1, ...]
+    assert np.array_equal(model.classes_, np.arange(len(model.classes_))), "classes_ must be 0..n-1"
+    n_features = model.coef_.shape[1]
+    weights = numpy_helper.from_array(model.coef_.T.astype(np.float32), name="W")
+    bias = numpy_helper.from_array(model.intercept_.astype(np.float32), name="b")
+    graph = helper.make_graph(
+        [
+            helper.make_node("MatMul", ["X", "W"], ["scores_raw"]),
+            helper.make_node("Add", ["scores_raw", "b"], ["scores"]),
+            helper.make_node("ArgMax", ["scores"], ["label"], axis=1, keepdims=0),
+        ],
+        "iris_linear",
+        inputs=[helper.make_tensor_value_info("X", TensorProto.FLOAT, [None, n_features])],
+        outputs=[helper.make_tensor_value_info("label", TensorProto.INT64, [None])],
+        initializer=[weights, bias],
+    )
+    # Pin the IR version so the file loads on older onnxruntime releases, not just the installed onnx
+    onnx_model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)], ir_version=8)
+    onnx.checker.check_model(onnx_model)
+    return onnx_model
+
+def main():
+    model = joblib.load(MODEL_PATH)
+    with tempfile.TemporaryDirectory() as tmp:
+        float_path = Path(tmp) / "simple_model.linear.onnx"
+        onnx.save(build_linear_graph(model), float_path)
+        quantize_dynamic(float_path, INT8_MODEL_PATH, weight_type=QuantType.QInt8)
+
+    # Report how often the int8 model agrees with the original estimator on the Iris data
+    X = load_iris().data.astype(np.float32)
+    session = InferenceSession(str(INT8_MODEL_PATH), providers=["CPUExecutionProvider"])
+    quantized = session.run(None, {"X": X})[0]
+    agreement = np.mean(quantized == model.predict(X))
+    print(f"Wrote {INT8_MODEL_PATH} from {MODEL_PATH} (agrees with joblib model on {agreement:.1%} of Iris samples)")
+
+if __name__ == "__main__":
+    main()
@@ -4,21 +4,24 @@ from fastapi.testclient import TestClient
 # though pytest usually handles this if run from the root.
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 # Import the FastAPI app instance
 from app.main import app
+from app import main
 
 # --- Test Cases ---
 
-# Test that doesn't require the model (can run without lifespan context)
+# Every test uses TestClient as a context manager so lifespan (model, batch worker, log listener) runs
 def test_read_root():
     """Test the root endpoint."""
-    client = TestClient(app) # No lifespan needed here
-    response = client.get("/")
-    assert response.status_code == 200
-    # **HIGHLIGHT: Ensure this message matches the API response**
-    assert response.json() == {"message": "Welcome to the Deploy ML Model API. Use /docs for details."}
+    with TestClient(app) as client:
+        response = client.get("/")
+        assert response.status_code == 200
+        # **HIGHLIGHT: Ensure this message matches the API response**
+        assert response.json() == {"message": "Welcome to the Deploy ML Model API. Use /docs for details."}
 
 # Tests that require the model loaded via lifespan
 def test_model_status():
@@ -33,16 +36,26 @@ def test_model_status():
         assert status["model_loaded"] is True, f"Model status reported not loaded. Path checked: {status.get('model_path_checked_at_startup')}"
         # **HIGHLIGHT: Ensure this key matches the API response**
         assert "model_path_checked_at_startup" in status
+        # Which backend wins depends on the optional dependencies (and a C compiler) available;
+        # each backend's correctness is covered in tests/test_backends.py
+        assert status["model_backend"] in [name for name, _, _ in main._FAST_BACKENDS] + ["sklearn"]
+
+def test_predict_joblib_fallback(monkeypatch):
+    """Test the memory-mapped joblib model is served when no faster backend is available."""
+    monkeypatch.setattr(main, "_FAST_BACKENDS", [])
+    with TestClient(app) as client:
+        status = client.get("/model_status").json()
+        assert status["model_backend"] == "sklearn"
+        response = client.post("/predict/", json={"features": [7.7, 3.0, 6.1, 2.3]})
+        assert response.status_code == 200, f"Expected 200 OK, got {response.status_code}. Response: {response.text}"
+        assert response.json()["class_name"] == "virginica"
 
 def test_predict_valid_input_setosa():
     """Test prediction with valid input expected to be class 0 (setosa)."""
     # Use TestClient as a context manager
     with TestClient(app) as client:
         payload = {
-            "sepal_length": 5.1,
-            "sepal_width": 3.5,
-            "petal_length": 1.4,
-            "petal_width": 0.2
+            "features": [5.1, 3.5, 1.4, 0.2]
         }
         response = client.post("/predict/", json=payload)
         assert response.status_code == 200, f"Expected 200 OK, got {response.status_code}. Response: {response.text}"
@@ -58,10 +71,7 @@ def test_predict_valid_input_versicolor():
     # Use TestClient as a context manager
     with TestClient(app) as client:
         payload = {
-            "sepal_length": 6.0,
-            "sepal_width": 2.7,
-            "petal_length": 4.1,
-            "petal_width": 1.3
+            "features": [6.0, 2.7, 4.1, 1.3]
         }
         response = client.post("/predict/", json=payload)
         assert response.status_code == 200, f"Expected 200 OK, got {response.status_code}. Response: {response.text}"
@@ -74,10 +84,7 @@ def test_predict_valid_input_virginica():
     # Use TestClient as a context manager
     with TestClient(app) as client:
         payload = {
-            "sepal_length": 7.7,
-            "sepal_width": 3.0,
-            "petal_length": 6.1,
-            "petal_width": 2.3
+            "features": [7.7, 3.0, 6.1, 2.3]
         }
         response = client.post("/predict/", json=payload)
         assert response.status_code == 200, f"Expected 200 OK, got {response.status_code}. Response: {response.text}"
@@ -85,31 +92,164 @@ def test_predict_valid_input_virginica():
         assert result["prediction"] == 2
         assert result["class_name"] == "virginica"
 
+def _without_native_backend(monkeypatch):
+    """Drop the native backend so /predict goes through the cache and batch worker."""
+    monkeypatch.setattr(main, "_FAST_BACKENDS", [b for b in main._FAST_BACKENDS if b[0] != "native"])
+
+def _force_single_batch(monkeypatch, size):
+    """Make the batch worker wait (for up to 10 s) until `size` requests are queued, then run them together."""
+    monkeypatch.setattr(main, "MAX_BATCH", size)
+    monkeypatch.setattr(main, "MAX_WAIT_MS", 10_000)
+
+class RecordingModel:
+    """Wraps a model and records the number of rows in every predict() call."""
+    def __init__(self, model):
+        self.model = model
+        self.batch_sizes = []
+
+    def predict(self, input_data):
+        self.batch_sizes.append(input_data.shape[0])
+        return self.model.predict(input_data)
+
+def test_predict_concurrent_requests(monkeypatch):
+    """Test concurrent predictions coalesced by the batch worker get their own results."""
+    _without_native_backend(monkeypatch)
+    payloads = [
+        ({"features": [5.1, 3.5, 1.4, 0.2]}, 0),
+        ({"features": [6.0, 2.7, 4.1, 1.3]}, 1),
+        ({"features": [7.7, 3.0, 6.1, 2.3]}, 2)
+    ] * 4
+    _force_single_batch(monkeypatch, len(payloads))
+    with TestClient(app) as client:
+        model = RecordingModel(main.ml_model)
+        monkeypatch.setattr(main, "ml_model", model)
+        with ThreadPoolExecutor(max_workers=len(payloads)) as pool:
+            responses = list(pool.map(lambda p: client.post("/predict/", json=p[0]), payloads))
+        for response, (_, expected) in zip(responses, payloads):
+            assert response.status_code == 200, f"Expected 200 OK, got {response.status_code}. Response: {response.text}"
+            assert response.json()["prediction"] == expected
+    # All requests were answered by one model call
+    assert model.batch_sizes == [len(payloads)]
+
+def test_predict_failing_row_does_not_fail_its_batch(monkeypatch):
+    """Test a row the model rejects only fails its own request, not the others batched with it."""
+    _without_native_backend(monkeypatch)
+
+    class RejectsLargeInput:
+        def predict(self, input_data):
+            if (input_data > 50).any():
+                raise ValueError("implausibly large measurement")
+            return np.zeros(input_data.shape[0], dtype=np.int64)
+
+    payloads = [{"features": [5.1, 3.5, 1.4, 0.2]}] * 7 + [{"features": [99.0, 3.5, 1.4, 0.2]}]
+    _force_single_batch(monkeypatch, len(payloads))
+    with TestClient(app) as client:
+        model = RecordingModel(RejectsLargeInput())
+        monkeypatch.setattr(main, "ml_model", model)
+        with ThreadPoolExecutor(max_workers=len(payloads)) as pool:
+            responses = list(pool.map(lambda p: client.post("/predict/", json=p), payloads))
+    assert [r.status_code for r in responses] == [200] * 7 + [500]
+    # One failed call on the whole batch, then the row-by-row retry
+    assert model.batch_sizes == [len(payloads)] + [1] * len(payloads)
+
+def test_predict_repeated_input_uses_cache(monkeypatch):
+    """Test identical inputs are served from the prediction cache."""
+    _without_native_backend(monkeypatch)
+    with TestClient(app) as client:
+        payload = {
+            "features": [5.1, 3.5, 1.4, 0.2]
+        }
+        first = client.post("/predict/", json=payload)
+        second = client.post("/predict/", json=payload)
+        assert first.json() == second.json()
+        assert list(main._prediction_cache) == [(5.1, 3.5, 1.4, 0.2)]
+    # Shutting down the lifespan releases the model and its cached results
+    assert len(main._prediction_cache) == 0
+
 # Tests for invalid input (don't strictly need the model, but using context manager is fine)
 def test_predict_invalid_input_missing_field():
-    """Test prediction with a missing required field."""
+    """Test prediction with a missing feature value."""
     # Use TestClient as a context manager (optional here, but consistent)
     with TestClient(app) as client:
         payload = {
-            "sepal_length": 5.1,
-            "sepal_width": 3.5,
-            "petal_length": 1.4
-            # Missing "petal_width"
+            "features": [5.1, 3.5, 1.4] # Missing petal_width
         }
         response = client.post("/predict/", json=payload)
         assert response.status_code == 422
         assert "detail" in response.json()
 
+def test_predict_invalid_input_extra_feature():
+    """Test prediction with more than four feature values."""
+    with TestClient(app) as client:
+        payload = {
+            "features": [5.1, 3.5, 1.4, 0.2, 9.9]
+        }
+        response = client.post("/predict/", json=payload)
+        assert response.status_code == 422
+        assert "detail" in response.json()
+
+def test_predict_invalid_input_non_finite():
+    """Test NaN, infinite and out-of-range feature values are rejected on both prediction endpoints."""
+    headers = {"Content-Type": "application/json"}
+    with TestClient(app) as client:
+        # Raw bodies: the JSON encoder refuses to emit these tokens, but clients can still send them
+        # 1e39 is finite as a float64 but overflows to inf in the float32 model input
+        for bad_value in ("NaN", "Infinity", "-Infinity", "1e39", "-1e39", "-0.5", "100.5"):
+            features = f"[{bad_value}, 1.0, 1.0, 1.0]"
+            response = client.post("/predict/", content=f'{{"features": {features}}}', headers=headers)
+            assert response.status_code == 422, f"Expected 422 for {bad_value}, got {response.status_code}"
+            response = client.post("/batch_predict/", content=f'{{"items": [{{"features": {features}}}]}}', headers=headers)
+            assert response.status_code == 422, f"Expected 422 for {bad_value}, got {response.status_code}"
+
 def test_predict_invalid_input_wrong_type():
-    """Test prediction with incorrect data type for a field."""
+    """Test prediction with incorrect data type for a feature."""
      # Use TestClient as a context manager (optional here, but consistent)
     with TestClient(app) as client:
         payload = {
-            "sepal_length": "five point one", # String instead of float
-            "sepal_width": 3.5,
-            "petal_length": 1.4,
-            "petal_width": 0.2
+            "features": ["five point one", 3.5, 1.4, 0.2] # String instead of float
         }
         response = client.post("/predict/", json=payload)
         assert response.status_code == 422
         assert "detail" in response.json()
+
+def test_batch_predict_valid_input():
+    """Test batch prediction returns one result per item, in input order."""
+    with TestClient(app) as client:
+        payload = {
+            "items": [
+                {"features": [5.1, 3.5, 1.4, 0.2]},
+                {"features": [6.0, 2.7, 4.1, 1.3]},
+                {"features": [7.7, 3.0, 6.1, 2.3]}
+            ]
+        }
+        response = client.post("/batch_predict/", json=payload)
+        assert response.status_code == 200, f"Expected 200 OK, got {response.status_code}. Response: {response.text}"
+        results = response.json()
+        assert [r["prediction"] for r in results] == [0, 1, 2]
+        assert [r["class_name"] for r in results] == ["setosa", "versicolor", "virginica"]
+
+def test_predict_and_batch_predict_agree():
+    """Test both endpoints classify an input near a decision boundary the same way."""
+    features = [6.023643249400513, 3.450463696325935, 3.789154904289172, 1.9486494471372438]
+    with TestClient(app) as client:
+        single = client.post("/predict/", json={"features": features}).json()
+        batch = client.post("/batch_predict/", json={"items": [{"features": features}]}).json()
+        assert batch == [single]
+
+def test_batch_predict_empty_batch():
+    """Test batch prediction rejects an empty list of items."""
+    with TestClient(app) as client:
+        response = client.post("/batch_predict/", json={"items": []})
+        assert response.status_code == 422
+        assert "detail" in response.json()
+
+def test_batch_predict_too_many_items():
+    """Test batch prediction rejects more than MAX_BATCH_ITEMS items."""
+    with TestClient(app) as client:
+        items = [{"features": [5.1, 3.5, 1.4, 0.2]}] * (main.MAX_BATCH_ITEMS + 1)
+        response = client.post("/batch_predict/", json={"items": items})
+        assert response.status_code == 422
+        assert response.json()["detail"][0]["type"] == "too_long"
+        # Exactly at the limit is still accepted
+        response = client.post("/batch_predict/", json={"items": items[:-1]})
+        assert response.status_code == 200
@@ -0,0 +1,77 @@
+# tests/test_backends.py
+import sys
+import os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.datasets import load_iris
+
+from app import backends
+from app.main import MODEL_PATH, LINEAR_MODEL_PATH, ONNX_MODEL_PATH
+
+BACKENDS = [
+    pytest.param(getattr(backends, "NativeLinearModel", None), LINEAR_MODEL_PATH, id="native",
+                 marks=pytest.mark.skipif(backends.cffi is None, reason="cffi not installed")),
+    pytest.param(backends.LinearModel, LINEAR_MODEL_PATH, id="linear"),
+    pytest.param(getattr(backends, "NumbaLinearModel", None), LINEAR_MODEL_PATH, id="numba",
+                 marks=pytest.mark.skipif(backends.njit is None, reason="numba not installed")),
+    pytest.param(backends.OnnxModel, ONNX_MODEL_PATH, id="onnx",
+                 marks=pytest.mark.skipif(backends.ort is None, reason="onnxruntime not installed")),
+]
+
+@pytest.mark.parametrize("loader, path", BACKENDS)
+def test_backend_matches_joblib_model(loader, path):
+    """Test each exported backend predicts the same classes as the original estimator."""
+    features = load_iris().data.astype(np.float32)
+    expected = joblib.load(MODEL_PATH).predict(features)
+    model = loader(path)
+    np.testing.assert_array_equal(model.predict(features), expected)
+    # A single row, as the batch worker sends under light load
+    assert model.predict(features[:1])[0] == expected[0]
+
+@pytest.mark.skipif(backends.cffi is None, reason="cffi not installed")
+def test_native_predict_one_matches_joblib_model():
+    """Test the compiled single-row entry point agrees with the original estimator."""
+    features = load_iris().data
+    expected = joblib.load(MODEL_PATH).predict(features)
+    model = backends.NativeLinearModel(LINEAR_MODEL_PATH)
+    assert [model.predict_one(*row) for row in features.tolist()] == expected.tolist()
+
+@pytest.mark.skipif(backends.cffi is None, reason="cffi not installed")
+def test_native_refuses_shared_cache_dir(tmp_path, monkeypatch):
+    """Test a cache directory other users can write to is never loaded from."""
+    cache_dir = tmp_path / "native"
+    cache_dir.mkdir()
+    cache_dir.chmod(0o777)
+    monkeypatch.setattr(backends, "NATIVE_CACHE_DIR", cache_dir)
+    with pytest.raises(PermissionError):
+        backends.NativeLinearModel(LINEAR_MODEL_PATH)
+
+@pytest.mark.skipif(backends.njit is None, reason="numba not installed")
+def test_numba_backend_survives_unwritable_cache(monkeypatch):
+    """Test app.backends still imports, and the numba backend works, when no JIT cache dir is writable."""
+    import importlib
+    from numba.core import caching
+
+    def no_cache_dir(self):
+        raise PermissionError("read-only filesystem")
+
+    monkeypatch.setattr(caching._CacheLocator, "ensure_cache_path", no_cache_dir)
+    try:
+        importlib.reload(backends)
+        features = load_iris().data.astype(np.float32)
+        expected = joblib.load(MODEL_PATH).predict(features)
+        np.testing.assert_array_equal(backends.NumbaLinearModel(LINEAR_MODEL_PATH).predict(features), expected)
+    finally:
+        monkeypatch.undo()
+        importlib.reload(backends)
+
+@pytest.mark.skipif(backends.cffi is None, reason="cffi not installed")
+def test_native_rejects_other_feature_counts(tmp_path):
+    """Test weights for a model without exactly 4 features are refused, not compiled with a wrong stride."""
+    weights_path = tmp_path / "weights.npy"
+    np.save(weights_path, np.ones((3, 4))) # 3 features + intercept
+    with pytest.raises(ValueError):
+        backends.NativeLinearModel(weights_path)